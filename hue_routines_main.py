@@ -2,20 +2,30 @@
 
 import argparse
 import asyncio
+import bisect
 import contextlib
+import functools
 import logging
-from datetime import datetime, timedelta
+import math
+import re
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
 
-import requests
+import aiohttp
+import orjson
 from aiohue import HueBridgeV2
 from aiohue.v2 import EventType
 from aiohue.v2.models.button import ButtonEvent
 from aiohue.v2.models.contact import ContactState
-from aiohue.v2.models.grouped_light import GroupedLight
 from aiohue.v2.models.resource import ResourceTypes
 from aiohue.v2.models.room import Room
 from aiohue.v2.models.zone import Zone
-from pytz import timezone
+
+# uvloop doesn't support windows, fall back to the default asyncio event loop there
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 import hue_config
 from custom_holidays import CustomHolidays
@@ -25,8 +35,28 @@ parser = argparse.ArgumentParser(description="Hue Routines")
 parser.add_argument("--debug", help="enable debug logging", action="store_true")
 args = parser.parse_args()
 
+# debug logging is only configured with --debug, so use the flag instead of checking the logger level each time
+debug_logging_enabled = args.debug
+
 bridge = HueBridgeV2(bridge_ip, hue_app_key)
 
+# aiohttp session for weather api calls, created in main() so requests don't block the event loop
+# and keep-alive connections are reused instead of a new tcp/tls handshake each time
+weather_session = None
+weather_api_url = "https://api.openweathermap.org/data/2.5/weather"
+# passed as params so aiohttp url-encodes them (ex. spaces in the city name)
+weather_api_params = {"q": city_name, "appid": weather_api_key, "units": "imperial"}
+weather_api_timeout_secs = 10
+# failed weather api calls are retried with exponential backoff up to this
+weather_api_max_retry_secs = 60 * 60
+# openweathermap only refreshes its data about every 10 mins, so reuse responses younger than that
+weather_api_cache_mins = 10
+weather_api_cached_response = None
+weather_api_cached_datetime = None
+# validators from the last response, sent back so an unchanged response comes back as an empty 304
+weather_api_cached_etag = None
+weather_api_cached_last_modified = None
+
 room_name_to_type_map = None
 room_type_zone = "zone"
 room_type_room = "room"
@@ -34,24 +64,66 @@ room_type_room = "room"
 room_name_to_id_map = None
 room_name_to_grouped_light_id_map = None
 
+# {normalized_zone_name: zone}
+zone_name_to_group_map = None
+# {normalized_room_name: room}
+room_name_to_group_map = None
+# {group_id: [scene]}
+group_id_to_scenes_map = None
+
 weather_group_name = "weather"
 weather_group_id = None
 weather_id = None
 weather_scene_map = None
+# set when the weather zone is turned on so weather_light_routine doesn't poll while it's off
+weather_zone_turned_on = asyncio.Event()
+# how long the inside/outside temp color is shown before switching to the weather scene
+weather_temp_scene_display_secs = 10
 
 hour_min_format = "%H:%M"
 
-rooms_to_time_scenes_map = None
-rooms_to_time_scene_datetimes_sorted_map = None
+update_vars_interval_secs = 60 * 15
+# set when bridge resources the variables are built from change, so they're refreshed before the next interval
+update_vars_needed = asyncio.Event()
+# let a burst of changes (ex. saving a scene for a whole room) settle so it only causes one refresh
+update_vars_settle_secs = 1
+update_vars_resource_types = (ResourceTypes.SCENE, ResourceTypes.DEVICE, ResourceTypes.ROOM, ResourceTypes.ZONE,
+                              ResourceTypes.MOTION, ResourceTypes.CONTACT, ResourceTypes.BUTTON)
+
+# tz object is immutable so build it once instead of on every datetime call
+my_tz = ZoneInfo(my_timezone)
 
-scene_start_time_sunset = "Sunset"
+# {room_name: {scene_start_minute_of_day: scene_id}}
+rooms_to_time_scenes_map = None
+# {room_name: ([scene_start_minute_of_day ascending], [scene_id])}
+rooms_to_time_scene_minutes_sorted_map = None
+# set after variables are refreshed so schedules_routine recomputes its wake up time for new or renamed scenes
+time_scenes_updated = asyncio.Event()
+
+# stored normalized (like weather_group_name) so it isn't renormalized for every scene
+scene_start_time_sunset = "sunset"
+# scene start times are matched after normalize_string,
+# ex. "8pm", "8p.m.", "10:30am", "8:5pm", "sunset", "sunset+30m", "sunset-1h", "sunset+1.5h", "sunset+1h30m"
+am_pm_time_regex = re.compile(r"^(\d{1,2})(?::(\d{1,2}))?(?:([ap])\.?m?\.?)?$")
+sunset_offset_time_regex = re.compile(r"^sunset(?:([+-])(?:(\d+(?:\.\d+)?)h[a-z]*)?(?:(\d+(?:\.\d+)?)m[a-z]*)?)?$")
 sunset_datetime = None
 last_fetched_sunset_time = None
+# optional latitude/longitude in hue_config.py to calculate sunset locally instead of calling the weather api
+sunset_location = (latitude, longitude) if "latitude" in globals() and "longitude" in globals() else None
+
+# {scene_name: scene start minute of day or None if the name has no start time}
+scene_name_to_start_minute_map = dict()
+# sunset_datetime the cached scene start minutes were parsed with
+scene_name_to_start_minute_map_sunset = None
 
 # {motion_id: [room_name, off_time_seconds, optional_contact_sensor_id]}
 motion_id_to_room_map = None
 # {motion_id: scheduled_off_datetime}
 motion_room_scheduled_off_time_map = None
+# set when a room gets a new scheduled off time so motion_room_off_routine can wake up early
+motion_room_scheduled_off_time_added = asyncio.Event()
+# motion ids whose off time was dropped because the door was closed, rescheduled when the door opens
+motion_ids_waiting_for_door_open = set()
 
 # {button_id: [room_name, device_name, button_control_id]}
 button_id_to_room_map = None
@@ -61,7 +133,13 @@ holiday_group_id = None
 holiday_id = None
 holiday_scene_map = dict()
 holiday_last_on_datetime = None
-us_and_state_holidays = CustomHolidays(subdiv=state, observed=False)
+# held while a holiday event is being handled so bursts of on events don't recall the scene more than once
+holiday_subscriber_lock = asyncio.Lock()
+# {holiday_date: normalized_holiday_name} for the year in holiday_dates_year
+holiday_date_to_name_map = dict()
+holiday_dates_year = None
+# characters stripped from holiday names in a single str.translate pass
+holiday_name_strip_table = str.maketrans("", "", " '.")
 
 
 async def main():
@@ -75,8 +153,17 @@ async def main():
             format="%(asctime)-15s %(levelname)-5s %(name)s -- %(message)s",
         )
 
-    async with HueBridgeV2(bridge_ip, hue_app_key) as b:
+    # keep the weather api connection alive between requests (aiohttp closes idle connections after 15s by default)
+    # and cache dns for the same period. with cached responses, requests go out at most every cache period
+    weather_keepalive_secs = max(weather_update_time_secs, weather_api_cache_mins * 60) + 60
+    weather_connector = aiohttp.TCPConnector(limit=4,
+                                             ttl_dns_cache=weather_keepalive_secs,
+                                             keepalive_timeout=weather_keepalive_secs)
+    async with (HueBridgeV2(bridge_ip, hue_app_key) as b,
+                aiohttp.ClientSession(connector=weather_connector,
+                                      timeout=aiohttp.ClientTimeout(total=weather_api_timeout_secs)) as session):
         global bridge
+        global weather_session
 
         # check if certain features are enabled in hue_config.py
         if "utility_off_rooms" in globals():
@@ -85,11 +172,23 @@ async def main():
             utility_off_rooms = None
 
         bridge = b
-        logging.debug(f"Connected to bridge: {bridge.bridge_id}")
+        weather_session = session
+        logging.debug("Connected to bridge: %s", bridge.bridge_id)
+
+        await update_vars(bridge)
 
-        update_vars(bridge)
+        # refresh variables early when scenes, rooms or devices are added, removed or renamed
+        bridge.events.subscribe(bridge_resource_changed_subscriber,
+                                event_filter=(EventType.RESOURCE_ADDED,
+                                              EventType.RESOURCE_UPDATED,
+                                              EventType.RESOURCE_DELETED),
+                                resource_filter=update_vars_resource_types)
 
-        bridge.subscribe(holiday_subscriber)
+        # not filtered by id since weather_group_id can change when variables are refreshed
+        bridge.groups.grouped_light.subscribe(weather_zone_subscriber, event_filter=EventType.RESOURCE_UPDATED)
+
+        # not filtered by id since the holiday zone can be created or change after startup
+        bridge.groups.grouped_light.subscribe(holiday_subscriber, event_filter=EventType.RESOURCE_UPDATED)
 
         # run all routines in background continuously
         async with asyncio.TaskGroup() as tg:
@@ -100,24 +199,40 @@ async def main():
             if motion_id_to_room_map:
                 # routine to turn off lights in motion rooms
                 tg.create_task(motion_room_off_routine(bridge))
-                for key_motion_id in motion_id_to_room_map:
-                    # routine to turn on time based scenes in motion rooms
-                    bridge.sensors.motion.subscribe(motion_time_based_subscriber,
-                                                    id_filter=key_motion_id)
+                # routine to turn on time based scenes in motion rooms
+                bridge.sensors.motion.subscribe(motion_time_based_subscriber,
+                                                id_filter=tuple(motion_id_to_room_map))
+                # routine to restart the off time in motion rooms when their door opens
+                # (not filtered by id since contact sensors can be matched to rooms after startup)
+                bridge.sensors.contact.subscribe(motion_room_contact_subscriber,
+                                                 event_filter=EventType.RESOURCE_UPDATED)
             if button_id_to_room_map:
-                for key_button_id in button_id_to_room_map:
-                    bridge.sensors.button.subscribe(button_time_based_subscriber,
-                                                    id_filter=key_button_id)
+                bridge.sensors.button.subscribe(button_time_based_subscriber,
+                                                id_filter=tuple(button_id_to_room_map))
 
 
 async def update_variables_routine(bridge):
     while True:
-        await asyncio.sleep(60 * 15)  # update every 15 mins
-        update_vars(bridge)
+        # update when relevant resources change, or every 15 mins at the latest
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(update_vars_needed.wait(), timeout=update_vars_interval_secs)
+        await asyncio.sleep(update_vars_settle_secs)
+        update_vars_needed.clear()
+        await update_vars(bridge)
+
+
+def bridge_resource_changed_subscriber(event_type, item):
+    # scene recalls and sensor reports update these resources all the time, only renames matter for the variables
+    if event_type == EventType.RESOURCE_UPDATED and "metadata" not in item:
+        return
+    update_vars_needed.set()
 
 
-def update_vars(bridge):
+async def update_vars(bridge):
     try:
+        # refresh sunset before scene times are parsed since they can be relative to it
+        await update_sunset_time()
+        update_group_maps(bridge)
         update_weather_vars(bridge)
         update_holiday_vars(bridge)
         update_time_based_scene_map_vars(bridge)
@@ -126,7 +241,35 @@ def update_vars(bridge):
         update_room_id_map(bridge)
 
     except Exception as ex:
-        logging.debug(msg=f"error updating global variables", exc_info=ex)
+        logging.debug(msg="error updating global variables", exc_info=ex)
+
+    time_scenes_updated.set()
+
+
+def update_group_maps(bridge):
+    global zone_name_to_group_map
+    global room_name_to_group_map
+    global group_id_to_scenes_map
+
+    # index groups by name and scenes by group in a single pass each,
+    # so the update functions below do dict lookups instead of rescanning the bridge
+    zone_name_to_group_map = {}
+    room_name_to_group_map = {}
+    for group in bridge.groups:
+        if isinstance(group, Zone):
+            zone_name_to_group_map[normalize_string(group.metadata.name)] = group
+        elif isinstance(group, Room):
+            room_name_to_group_map[normalize_string(group.metadata.name)] = group
+
+    group_id_to_scenes_map = {}
+    for scene in bridge.scenes:
+        group_id_to_scenes_map.setdefault(scene.group.rid, []).append(scene)
+
+
+def get_group_scenes(group_id):
+    if not group_id_to_scenes_map:
+        return []
+    return group_id_to_scenes_map.get(group_id, [])
 
 
 def update_room_id_map(bridge):
@@ -135,71 +278,46 @@ def update_room_id_map(bridge):
     try:
         room_name_to_id_map = {}
         room_name_to_grouped_light_id_map = {}
-        for room in bridge.groups.room:
-            room_name = normalize_string(room.metadata.name)
+        for room_name, room in room_name_to_group_map.items():
             room_name_to_grouped_light_id_map[room_name] = room.grouped_light
             room_name_to_id_map[room_name] = room.id
-        for room in bridge.groups.zone:
-            room_name = normalize_string(room.metadata.name)
+        for room_name, room in zone_name_to_group_map.items():
             room_name_to_grouped_light_id_map[room_name] = room.grouped_light
             room_name_to_id_map[room_name] = room.id
 
     except Exception as ex:
-        logging.debug(msg=f"error updating room id map", exc_info=ex)
+        logging.debug(msg="error updating room id map", exc_info=ex)
 
 
 def update_time_based_scene_map_vars(bridge):
     global room_name_to_type_map
     global rooms_to_time_scenes_map
-    global rooms_to_time_scene_datetimes_sorted_map
+    global rooms_to_time_scene_minutes_sorted_map
 
     room_name_to_type_map = {}
     rooms_to_time_scenes_map = {}
-    rooms_to_time_scene_datetimes_sorted_map = {}
+    rooms_to_time_scene_minutes_sorted_map = {}
 
-    for group in bridge.groups:
+    groups_with_type = ([(room_name, group, room_type_room) for room_name, group in room_name_to_group_map.items()]
+                        + [(room_name, group, room_type_zone) for room_name, group in zone_name_to_group_map.items()])
+    for room_name, group, room_type in groups_with_type:
         # setup auto time-based scenes for room
-        if isinstance(group, Zone):
-            room_type = room_type_zone
-        elif isinstance(group, Room):
-            room_type = room_type_room
-        else:
-            room_type = None
-        if not room_type:
-            continue
-
-        room_name = normalize_string(group.metadata.name)
         room_name_to_type_map[room_name] = room_type
 
         room_time_scenes_map = {}
-        group_id = group.id
-        if room_type == room_type_zone:
-            scenes = bridge.groups.zone.get_scenes(group_id)
-        else:
-            # must be room type and not zone
-            scenes = bridge.groups.room.get_scenes(group_id)
-        for scene in scenes:
+        for scene in get_group_scenes(group.id):
             scene_name = scene.metadata.name
             add_scene_to_time_map(room_time_scenes_map, scene_name, scene.id)
 
         if room_time_scenes_map is not None and len(room_time_scenes_map) != 0:
-            # setup sorted scene datetimes to be used for time-based scenes
-            current_datetime = get_current_datetime()
-            room_scene_datetimes_sorted = []
-            tz = timezone(my_timezone)
-            for scene_time in room_time_scenes_map:
-                scene_datetime = (datetime.strptime(scene_time, hour_min_format)
-                                  .replace(year=current_datetime.year,
-                                           month=current_datetime.month,
-                                           day=current_datetime.day))
-                scene_datetime = tz.localize(scene_datetime)
-                room_scene_datetimes_sorted.append(scene_datetime)
-            room_scene_datetimes_sorted.sort(reverse=True)
+            # parallel sorted arrays of scene start minutes and scene ids to bisect for time-based scenes
+            room_scene_minutes_sorted = sorted(room_time_scenes_map)
+            room_scene_ids_sorted = [room_time_scenes_map[minute] for minute in room_scene_minutes_sorted]
 
             # set time based scenes for room in global map
             rooms_to_time_scenes_map[room_name] = room_time_scenes_map
-            rooms_to_time_scene_datetimes_sorted_map[room_name] = room_scene_datetimes_sorted
-    logging.debug(f"updated rooms_to_time_scene_datetimes_sorted_map: {rooms_to_time_scene_datetimes_sorted_map}")
+            rooms_to_time_scene_minutes_sorted_map[room_name] = (room_scene_minutes_sorted, room_scene_ids_sorted)
+    logging.debug("updated rooms_to_time_scene_minutes_sorted_map: %s", rooms_to_time_scene_minutes_sorted_map)
 
 
 def update_button_time_based_vars(bridge):
@@ -208,25 +326,31 @@ def update_button_time_based_vars(bridge):
     try:
         if hue_config.button_time_based_rooms:
             button_id_to_room_map = {}
+
+            # index devices by normalized name once instead of scanning all devices for every button config
+            device_name_to_device_map = {}
+            for device in bridge.devices:
+                if device.metadata and device.metadata.name:
+                    device_name_to_device_map.setdefault(normalize_string(device.metadata.name), device)
+
             for button_config in button_time_based_rooms:
                 room_name = normalize_string(button_config[0])
                 device_name = normalize_string(button_config[1])
                 button_control_id = button_config[2]
-                for device in bridge.devices:
-                    if device.metadata and device.metadata.name and normalize_string(
-                            device.metadata.name) == device_name:
-                        for resource in device.services:
-                            if resource.rtype == ResourceTypes.BUTTON:
-                                button = bridge.sensors.button.get(id=resource.rid)
-                                if button.metadata.control_id == button_control_id:
-                                    button_id = button.id
-                                    button_id_to_room_map[button_id] = [room_name, device_name, button_control_id]
-                        break
+                device = device_name_to_device_map.get(device_name)
+                if not device:
+                    continue
+                for resource in device.services:
+                    if resource.rtype == ResourceTypes.BUTTON:
+                        button = bridge.sensors.button.get(id=resource.rid)
+                        if button.metadata.control_id == button_control_id:
+                            button_id = button.id
+                            button_id_to_room_map[button_id] = [room_name, device_name, button_control_id]
 
-            logging.debug(f"updated button_id_to_room_map: {button_id_to_room_map}")
+            logging.debug("updated button_id_to_room_map: %s", button_id_to_room_map)
 
     except Exception as ex:
-        logging.debug(msg=f"error updating motion time based variables", exc_info=ex)
+        logging.debug(msg="error updating motion time based variables", exc_info=ex)
 
 
 def update_motion_time_based_vars(bridge):
@@ -239,26 +363,33 @@ def update_motion_time_based_vars(bridge):
             if not motion_room_scheduled_off_time_map:
                 # instantiate if not instantiated
                 motion_room_scheduled_off_time_map = {}
+
+            # normalize each sensor's device name once instead of a get_device scan per sensor for every room
+            device_name_by_service_id = {service.rid: normalize_string(device.metadata.name)
+                                         for device in bridge.devices for service in device.services}
+            motion_sensor_names = [(motion_sensor.id, device_name_by_service_id.get(motion_sensor.id, ""))
+                                   for motion_sensor in bridge.sensors.motion]
+            contact_sensor_names = [(contact_sensor.id, device_name_by_service_id.get(contact_sensor.id, ""))
+                                    for contact_sensor in bridge.sensors.contact]
+
             for motion_config in motion_time_based_rooms:
                 room_name = normalize_string(motion_config[0])
                 room_off_time_seconds = motion_config[1]
                 motion_id = None
                 optional_contact_id = None
 
-                for motion_sensor in bridge.sensors.motion:
-                    sensor_name = normalize_string(bridge.sensors.get_device(id=motion_sensor.id).metadata.name)
+                for sensor_id, sensor_name in motion_sensor_names:
                     if room_name in sensor_name:
-                        motion_id = motion_sensor.id
+                        motion_id = sensor_id
                         break
                 if not motion_id:
-                    logging.debug(f"error: could not find expected motion sensor named for {room_name}")
+                    logging.debug("error: could not find expected motion sensor named for %s", room_name)
                     continue
 
-                for contact_sensor in bridge.sensors.contact:
-                    contact_sensor_name = normalize_string(bridge.sensors.get_device(id=contact_sensor.id).metadata.name)
+                for sensor_id, contact_sensor_name in contact_sensor_names:
                     if room_name in contact_sensor_name:
-                        logging.debug(f"found contact sensor [{contact_sensor_name}] to use for {room_name}")
-                        optional_contact_id = contact_sensor.id
+                        logging.debug("found contact sensor [%s] to use for %s", contact_sensor_name, room_name)
+                        optional_contact_id = sensor_id
                         break
 
                 motion_room_info = [room_name, room_off_time_seconds]
@@ -267,8 +398,16 @@ def update_motion_time_based_vars(bridge):
 
                 motion_id_to_room_map[motion_id] = motion_room_info
 
+            # rooms waiting on a door that is no longer matched to them go back to the normal off time
+            for motion_id in list(motion_ids_waiting_for_door_open):
+                motion_config = motion_id_to_room_map.get(motion_id)
+                if not motion_config:
+                    motion_ids_waiting_for_door_open.discard(motion_id)
+                elif len(motion_config) < 3:
+                    schedule_motion_lights_off_time(motion_id, motion_config[1])
+
     except Exception as ex:
-        logging.debug(msg=f"error updating motion time based variables", exc_info=ex)
+        logging.debug(msg="error updating motion time based variables", exc_info=ex)
 
 
 def update_holiday_vars(bridge):
@@ -276,15 +415,13 @@ def update_holiday_vars(bridge):
     global holiday_id
 
     try:
-        for group in bridge.groups:
-            if isinstance(group, Zone):
-                if normalize_string(group.metadata.name) == normalize_string(holiday_zone_name):
-                    holiday_group_id = group.grouped_light
-                    holiday_id = group.id
-                    break
+        group = zone_name_to_group_map.get(normalize_string(holiday_zone_name))
+        if group:
+            holiday_group_id = group.grouped_light
+            holiday_id = group.id
 
     except Exception as ex:
-        logging.debug(msg=f"error updating holiday variables", exc_info=ex)
+        logging.debug(msg="error updating holiday variables", exc_info=ex)
 
 
 def update_weather_vars(bridge):
@@ -294,140 +431,119 @@ def update_weather_vars(bridge):
     global weather_group_name
 
     try:
-        for group in bridge.groups:
-            if isinstance(group, Zone):
-                if normalize_string(group.metadata.name) == weather_group_name:
-                    weather_group_id = group.grouped_light
-                    weather_id = group.id
-                    break
+        group = zone_name_to_group_map.get(weather_group_name)
+        if group:
+            weather_group_id = group.grouped_light
+            weather_id = group.id
 
         if not weather_group_id or not weather_id:
             return
 
         weather_scene_map = dict()
-        for scene in bridge.groups.zone.get_scenes(weather_id):
+        for scene in get_group_scenes(weather_id):
             scene_name = normalize_string(scene.metadata.name)
             scene_id = scene.id
 
             weather_scene_map[scene_name] = scene_id
 
-        logging.debug(f"weather_scene_map: {weather_scene_map}")
+        logging.debug("weather_scene_map: %s", weather_scene_map)
 
     except Exception as ex:
-        logging.debug(msg=f"error updating weather variables", exc_info=ex)
+        logging.debug(msg="error updating weather variables", exc_info=ex)
         return
 
 
 def add_scene_to_time_map(time_scenes_map, scene_name, scene_id):
+    global scene_name_to_start_minute_map_sunset
+
+    if scene_name_to_start_minute_map_sunset != sunset_datetime:
+        # sunset based start times change with the sunset, so reparse all scene names
+        scene_name_to_start_minute_map.clear()
+        scene_name_to_start_minute_map_sunset = sunset_datetime
+
+    if scene_name in scene_name_to_start_minute_map:
+        scene_start_minute = scene_name_to_start_minute_map[scene_name]
+    else:
+        scene_start_minute = parse_scene_start_minute(scene_name)
+        scene_name_to_start_minute_map[scene_name] = scene_start_minute
+
+    if scene_start_minute is not None:
+        # map format: { scene start minute of day -> scene id }
+        time_scenes_map[scene_start_minute] = scene_id
+
+
+def parse_scene_start_minute(scene_name):
     try:
         # Example scene names with time: "Evening (8pm)", "Evening (Sunset + 30m)"
         # time in parentheses will be used as scene start time
         name_parts = scene_name.split("(")
         if len(name_parts) > 1:
             scene_start_time = normalize_string(name_parts[1].split(")")[0])
-            if normalize_string(scene_start_time_sunset) in scene_start_time:
+            if scene_start_time_sunset in scene_start_time:
                 # start time in scene name uses sunset offset time
                 scene_start_datetime = parse_sunset_offset_time_from_scene_name(scene_start_time)
             else:
                 # start time in scene name is in hour:min am/pm format
-                normalized_scene_start_time = normalize_am_pm_time(scene_start_time)
-                scene_start_datetime = datetime.strptime(normalized_scene_start_time, "%I:%M %p")
-            logging.debug(f"scene_name: {scene_name}, scene_start_datetime: {scene_start_datetime}")
+                scene_start_datetime = parse_am_pm_time(scene_start_time)
+            logging.debug("scene_name: %s, scene_start_datetime: %s", scene_name, scene_start_datetime)
 
-            # map format: { scene start time -> scene id }
-            time_string = scene_start_datetime.strftime(hour_min_format)
-            time_scenes_map[time_string] = scene_id
+            return scene_start_datetime.hour * 60 + scene_start_datetime.minute
     except Exception as ex:
-        logging.debug(msg=f"error parsing scene name:{scene_name} when adding to time scenes map", exc_info=ex)
-        return
+        logging.debug("error parsing scene name:%s when adding to time scenes map", scene_name, exc_info=ex)
+    return None
 
 
 def parse_sunset_offset_time_from_scene_name(scene_start_time: str):
+    match = sunset_offset_time_regex.match(scene_start_time)
+    if not match:
+        raise Exception(f"scene_start_time: '{scene_start_time}' is not sunset or sunset +/- an offset in h or m")
+
     scene_start_datetime = get_sunset_time()
-    if len(scene_start_time) == len(scene_start_time_sunset):
+    sign, offset_hours, offset_minutes = match.groups()
+    if not sign:
         # start time is just "sunset"
         return scene_start_datetime
+    if not offset_hours and not offset_minutes:
+        raise Exception(f"could not find time unit 'h' or 'm' in offset: {scene_start_time}")
 
-    # get offset from sunset time in scene name
-    is_positive_offset = True
-    positive_offset = scene_start_time.split("+")
-
-    if len(positive_offset) > 1:
-        offset = positive_offset[1]
-    else:
-        negative_offset = scene_start_time.split("-")
-        if len(negative_offset) > 1:
-            offset = negative_offset[1]
-            is_positive_offset = False
-        else:
-            raise Exception(f"scene_start_time: '{scene_start_time}' does not contain + or -")
-
-    index = 0
-    while index < len(offset):
-        if offset[index] == "h" or offset[index] == "m":
-            break
-        index += 1
-    if index == 0 or index == len(offset):
-        raise Exception(f"could not find time unit 'h' or 'm' in offset: {offset}")
-
-    offset_amount = int(offset[:index])
-    if not is_positive_offset:
-        offset_amount = -offset_amount
-    if offset[index] == "h":
-        scene_start_datetime = scene_start_datetime + timedelta(hours=offset_amount)
-    else:
-        # offset has 'm' so is in minutes
-        scene_start_datetime = scene_start_datetime + timedelta(minutes=offset_amount)
+    offset = timedelta(hours=float(offset_hours or 0), minutes=float(offset_minutes or 0))
+    if sign == "-":
+        return scene_start_datetime - offset
+    return scene_start_datetime + offset
 
-    return scene_start_datetime
 
+@functools.lru_cache(maxsize=256)
+def parse_am_pm_time(time_string: str) -> time:
+    match = am_pm_time_regex.match(normalize_string(time_string))
+    if not match:
+        raise Exception(f"time_string: '{time_string}' is not in hour:min am/pm format")
 
-def normalize_am_pm_time(time_string):
-    time_string = normalize_string(time_string)
-    time_parts = time_string.split("a")
-    time_is_am = False
-    if len(time_parts) > 1:
-        time_is_am = True
-        time_string = time_parts[0]
-    else:
-        time_string = time_string.split("p")[0]
-
-    split_on_colon = time_string.split(":")
-    if len(split_on_colon) == 1:
-        time_string = time_string + ":00"
-    if len(time_string) == 4:
-        time_string = "0" + time_string
-    time_string = time_string + " "
-    if time_is_am:
-        time_string = time_string + "AM"
-    else:
-        time_string = time_string + "PM"
-
-    return time_string
+    hour = int(match.group(1))
+    minute = int(match.group(2) or 0)
+    if not 1 <= hour <= 12 or minute > 59:
+        raise Exception(f"time_string: '{time_string}' is not a valid 12 hour time")
+    # times without am/pm are treated as pm
+    is_pm = match.group(3) != "a"
+    return time(hour=hour % 12 + (12 if is_pm else 0), minute=minute)
 
 
 def update_holiday_scenes():
     global holiday_scene_map
-    holiday_scene_map = dict()
-    for scene in bridge.groups.zone.get_scenes(holiday_id):
-        scene_name = normalize_holiday_name(scene.metadata.name)
-        holiday_scene_map[scene_name] = scene.id
+    # build the new map before swapping it in so readers never see a partially filled map
+    holiday_scene_map = {normalize_holiday_name(scene.metadata.name): scene.id
+                         for scene in get_group_scenes(holiday_id)}
     return holiday_scene_map
 
 
 def discover_scenes_in_zone(zone_id):
-    scene_map = dict()
-    for scene in bridge.groups.zone.get_scenes(zone_id):
-        scene_name = normalize_string(scene.metadata.name)
-        scene_map[scene_name] = scene.id
-    return scene_map
+    return {normalize_string(scene.metadata.name): scene.id for scene in get_group_scenes(zone_id)}
 
 
 async def button_time_based_subscriber(event_type, item):
     try:
         global button_id_to_room_map
         if item.button.button_report.event == ButtonEvent.INITIAL_PRESS:
-            logging.debug(f"button initial press: {item}")
+            logging.debug("button initial press: %s", item)
             button_id = item.id
             button_config = button_id_to_room_map[button_id]
             room_name = button_config[0]
@@ -441,11 +557,11 @@ async def button_time_based_subscriber(event_type, item):
                 await bridge.groups.grouped_light.set_state(id=room_group_id, on=False)
             else:
                 # light is off, button press turns on to time-based scene
-                logging.debug(f"button press in {room_name} when lights are off, turning lights on")
+                logging.debug("button press in %s when lights are off, turning lights on", room_name)
                 await turn_on_room_to_time_based_scene(room_name=room_name, room_group_id=room_group_id)
 
     except Exception as ex:
-        logging.debug(msg=f"error processing event for time-based button press", exc_info=ex)
+        logging.debug(msg="error processing event for time-based button press", exc_info=ex)
 
 
 async def turn_on_room_to_time_based_scene(room_name: str, room_group_id: str):
@@ -457,32 +573,21 @@ async def turn_on_room_to_time_based_scene(room_name: str, room_group_id: str):
 
 
 def find_time_based_scene_for_current_time(room_name: str):
-    room_time_scenes_map = rooms_to_time_scenes_map[room_name]
-    room_scene_datetimes_sorted = rooms_to_time_scene_datetimes_sorted_map[room_name]
-    if room_time_scenes_map is None or room_scene_datetimes_sorted is None:
-        logging.debug(f"could not find time based scenes for {room_name}, "
-                      f"room_time_scenes_map: {room_time_scenes_map}, "
-                      f"room_scene_datetimes_sorted:{room_scene_datetimes_sorted}")
+    room_scene_minutes_and_ids = (rooms_to_time_scene_minutes_sorted_map.get(room_name)
+                                  if rooms_to_time_scene_minutes_sorted_map else None)
+    if not room_scene_minutes_and_ids:
+        logging.debug("could not find time based scenes for %s", room_name)
         return None
+    room_scene_minutes_sorted, room_scene_ids_sorted = room_scene_minutes_and_ids
 
     current_datetime = get_current_datetime()
-    datetime_after = room_scene_datetimes_sorted[0]
-    logging.debug(f"{room_name} default datetime_after: {datetime_after}")
-    logging.debug(f"{room_name} current_datetime to compare to sorted scene times: {current_datetime}")
-    for scene_datetime in room_scene_datetimes_sorted:
-        if current_datetime >= scene_datetime:
-            datetime_after = scene_datetime
-            logging.debug(f"{room_name} found new datetime_after: {datetime_after}")
-            break
-
-    datetime_after_string = datetime_after.strftime(hour_min_format)
-    logging.debug(f"{room_name} datetime_after_string: {datetime_after_string}")
-    scene_id = room_time_scenes_map.get(datetime_after_string)
-    if not scene_id:
-        logging.debug(f"could not find scene_id for datetime_after_string: {datetime_after_string}, "
-                      f"in {room_name}"
-                      f"room_time_scenes_map: {room_time_scenes_map}, "
-                      f"room_scene_datetimes_sorted:{room_scene_datetimes_sorted}")
+    current_minute = current_datetime.hour * 60 + current_datetime.minute
+    # latest scene starting at or before now. before the first scene of the day,
+    # index -1 wraps around to the last scene from the previous evening
+    index = bisect.bisect_right(room_scene_minutes_sorted, current_minute) - 1
+    scene_id = room_scene_ids_sorted[index]
+    logging.debug("%s current_minute: %s, found scene start minute: %s, scene_id: %s",
+                  room_name, current_minute, room_scene_minutes_sorted[index], scene_id)
     return scene_id
 
 
@@ -502,11 +607,26 @@ async def motion_time_based_subscriber(event_type, item):
             grouped_light = bridge.groups.grouped_light.get(id=room_group_id)
             if not grouped_light.on.on:
                 # motion while lights are off, turn them on
-                logging.debug(f"detected motion in {room_name} when lights are off, turning lights on")
+                logging.debug("detected motion in %s when lights are off, turning lights on", room_name)
                 await turn_on_room_to_time_based_scene(room_name=room_name, room_group_id=room_group_id)
 
     except Exception as ex:
-        logging.debug(msg=f"error processing event for time-based motion", exc_info=ex)
+        logging.debug(msg="error processing event for time-based motion", exc_info=ex)
+
+
+async def motion_room_contact_subscriber(event_type, item):
+    try:
+        global motion_id_to_room_map
+        if motion_ids_waiting_for_door_open and item.contact_report.state == ContactState.NO_CONTACT:
+            for motion_id in list(motion_ids_waiting_for_door_open):
+                motion_config = motion_id_to_room_map.get(motion_id)
+                if motion_config and 2 < len(motion_config) and motion_config[2] == item.id:
+                    # door opened in a room that was kept on because it was closed, restart the off time
+                    logging.debug("door opened in %s, scheduling lights off time", motion_config[0])
+                    schedule_motion_lights_off_time(motion_id, motion_config[1])
+
+    except Exception as ex:
+        logging.debug(msg="error processing event for motion room contact sensor", exc_info=ex)
 
 
 def schedule_motion_lights_off_time(motion_id: str, off_time_seconds: int):
@@ -517,18 +637,30 @@ def schedule_motion_lights_off_time(motion_id: str, off_time_seconds: int):
 
         current_datetime = get_current_datetime()
         scheduled_off_datetime = current_datetime + timedelta(seconds=off_time_seconds)
+        motion_ids_waiting_for_door_open.discard(motion_id)
 
+        if motion_id not in motion_room_scheduled_off_time_map:
+            # rescheduling only moves off times later, only a new one can be earlier than what the routine waits on
+            motion_room_scheduled_off_time_added.set()
         motion_room_scheduled_off_time_map[motion_id] = scheduled_off_datetime
 
     except Exception as ex:
-        logging.debug(msg=f"error scheduling next lights off time for motion sensor", exc_info=ex)
+        logging.debug(msg="error scheduling next lights off time for motion sensor", exc_info=ex)
 
 
 async def holiday_subscriber(event_type, item):
+    if item.id != holiday_group_id:
+        return
+    if holiday_subscriber_lock.locked():
+        # an earlier on event is still being handled, drop this one
+        return
+    async with holiday_subscriber_lock:
+        await handle_holiday_event(item)
+
+
+async def handle_holiday_event(item):
     try:
-        if (isinstance(item, GroupedLight)
-                and item.id == holiday_group_id
-                and item.on.on is True):
+        if item.on.on is True:
 
             current_datetime = get_current_datetime()
             global holiday_last_on_datetime
@@ -536,14 +668,13 @@ async def holiday_subscriber(event_type, item):
             if (holiday_last_on_datetime is None
                     or holiday_last_on_datetime <= current_datetime - timedelta(hours=holiday_scene_interval_hours)):
 
-                update_holiday_scenes()
-
-                current_date = current_datetime.strftime('%Y-%m-%d')
-                holiday = us_and_state_holidays.get(current_date)
+                current_date = current_datetime.date()
+                normalized_holiday_name = get_holiday_dates_map(current_date.year).get(current_date)
 
-                if holiday is not None:
-                    logging.debug(f"it's a holiday! {holiday}")
-                    normalized_holiday_name = normalize_holiday_name(holiday)
+                if normalized_holiday_name is not None:
+                    logging.debug("it's a holiday! %s", normalized_holiday_name)
+                    # only build the holiday scene map when there is a holiday to find a scene for
+                    update_holiday_scenes()
                     scene_id = holiday_scene_map.get(normalized_holiday_name)
                     if scene_id is not None:
                         prev_brightness = item.dimming.brightness
@@ -552,7 +683,20 @@ async def holiday_subscriber(event_type, item):
             holiday_last_on_datetime = current_datetime
 
     except Exception as ex:
-        logging.debug(msg=f"error activating holiday lights", exc_info=ex)
+        logging.debug(msg="error activating holiday lights", exc_info=ex)
+
+
+def get_holiday_dates_map(year: int):
+    global holiday_date_to_name_map
+    global holiday_dates_year
+    if holiday_dates_year != year:
+        # build the year's holidays once so events only do a dict lookup
+        year_holidays = CustomHolidays(subdiv=state, observed=False, years=year)
+        holiday_date_to_name_map = {holiday_date: normalize_holiday_name(holiday_name)
+                                    for holiday_date, holiday_name in year_holidays.items()}
+        holiday_dates_year = year
+        logging.debug("updated holiday_date_to_name_map: %s", holiday_date_to_name_map)
+    return holiday_date_to_name_map
 
 
 # change my light depending on weather
@@ -562,6 +706,13 @@ async def weather_light_routine(bridge):
     global weather_id
     global weather_scene_map
 
+    # bind bridge methods once instead of walking the attribute chains every tick
+    get_grouped_light = bridge.groups.grouped_light.get
+    recall_scene = bridge.scenes.recall
+
+    # set while the weather api is failing
+    weather_api_retry_secs = None
+
     # run routine
     while True:
         try:
@@ -571,105 +722,137 @@ async def weather_light_routine(bridge):
             default_scene_id = weather_scene_map.get("default")
 
             # if weather scene isn't on, don't do anything
-            weather_zone_state = bridge.groups.grouped_light.get(weather_group_id)
+            weather_zone_state = get_grouped_light(weather_group_id)
             weather_zone_is_on = weather_zone_state.on.on
-            logging.debug(f"weather_zone_is_on: {weather_zone_is_on}")
+            logging.debug("weather_zone_is_on: %s", weather_zone_is_on)
 
             if weather_zone_is_on:
                 prev_weather_zone_brightness = weather_zone_state.dimming.brightness
-                logging.debug(f"weather_zone_brightness: {prev_weather_zone_brightness}")
+                logging.debug("weather_zone_brightness: %s", prev_weather_zone_brightness)
 
-                weather_api_response = call_weather_api()
-                parse_sunset_time_and_update(weather_api_response)
+                try:
+                    weather_data = await call_weather_api()
+                    weather_api_retry_secs = None
+                except (aiohttp.ClientError, TimeoutError) as ex:
+                    weather_api_retry_secs = get_weather_api_retry_secs(weather_api_retry_secs, ex)
+                    logging.debug("retrying weather api in %s secs", weather_api_retry_secs)
+                    raise
+                parse_sunset_time_and_update(weather_data)
 
-                cur_weather = normalize_string(str(weather_api_response.json().get("weather")[0].get("main")))
-                logging.debug(f"current weather: {cur_weather}")
+                cur_weather = normalize_string(str(weather_data["weather"][0]["main"]))
+                logging.debug("current weather: %s", cur_weather)
 
                 # animate lights for inside/outside temp difference
                 try:
                     inside_temp = get_inside_temp_in_f(bridge)
                     # feels like temp
-                    outside_temp = weather_api_response.json().get("main").get("feels_like")
-                    logging.debug(f"outside temp: {outside_temp}")
-
-                    upper_range = inside_temp + weather_temp_diff_range
-                    lower_range = inside_temp - weather_temp_diff_range
-                    freezing_temp = 32
-                    if outside_temp <= freezing_temp:
-                        logging.debug(f"outside temp is lower than freezing_temp: {freezing_temp}")
-                        temp_scene = weather_temp_freezing_scene
-                    elif outside_temp < lower_range:
-                        logging.debug(f"outside temp is lower than {lower_range} degrees")
-                        temp_scene = weather_temp_colder_scene
-                    elif outside_temp > upper_range:
-                        logging.debug(f"outside temp is higher than {upper_range} degrees")
-                        temp_scene = weather_temp_hotter_scene
-                    else:
-                        # outside temp close to inside
-                        logging.debug(f"outside temp is close to inside temp")
-                        temp_scene = weather_temp_same_scene
+                    outside_temp = weather_data["main"]["feels_like"]
+                    logging.debug("outside temp: %s", outside_temp)
 
+                    temp_scene = get_weather_temp_scene(inside_temp, outside_temp)
                     temp_scene_id = weather_scene_map.get(temp_scene)
                     if temp_scene_id is None:
                         raise Exception(f"could not find scene named '{temp_scene}'")
 
-                    # show color for temp diff
-                    await bridge.scenes.recall(temp_scene_id,
-                                               duration=weather_transition_time_ms,
-                                               brightness=prev_weather_zone_brightness)
-                    await asyncio.sleep(10)
+                    # show color for temp diff. the display time starts when the recall is sent
+                    # instead of after the bridge responds
+                    async with asyncio.TaskGroup() as temp_tg:
+                        temp_tg.create_task(recall_scene(temp_scene_id,
+                                                         duration=weather_transition_time_ms,
+                                                         brightness=prev_weather_zone_brightness))
+                        temp_tg.create_task(asyncio.sleep(weather_temp_scene_display_secs))
 
                 except Exception as ex:
-                    logging.debug(msg=f"error changing light for inside/outside temp difference", exc_info=ex)
+                    logging.debug(msg="error changing light for inside/outside temp difference", exc_info=ex)
 
                 # change to scene for current weather
                 scene_id = weather_scene_map.get(cur_weather)
                 if scene_id is None:
-                    logging.debug(f"no scene named '{cur_weather}' in weather scene map")
+                    logging.debug("no scene named '%s' in weather scene map", cur_weather)
                     if default_scene_id is not None:
                         scene_id = default_scene_id
 
+                # refetch zone state once in case it was changed during the temp animation
+                weather_zone_state = get_grouped_light(weather_group_id)
+
                 # if scene_id was found and weather zone is still on
-                if scene_id is not None and bridge.groups.grouped_light.get(weather_group_id).on.on:
-                    # refetch current light brightness in case it was changed in the meantime
-                    prev_weather_zone_brightness = bridge.groups.grouped_light.get(weather_group_id).dimming.brightness
+                if scene_id is not None and weather_zone_state.on.on:
+                    prev_weather_zone_brightness = weather_zone_state.dimming.brightness
                     # turn on correct weather scene
-                    await bridge.scenes.recall(scene_id,
-                                               duration=weather_transition_time_ms,
-                                               brightness=prev_weather_zone_brightness)
+                    await recall_scene(scene_id,
+                                       duration=weather_transition_time_ms,
+                                       brightness=prev_weather_zone_brightness)
                 else:
-                    logging.debug(f"no scene named default in weather scene map, not changing weather light")
+                    logging.debug("no scene named default in weather scene map, not changing weather light")
 
         except Exception as ex:
-            logging.debug(msg=f"error changing weather light", exc_info=ex)
+            logging.debug(msg="error changing weather light", exc_info=ex)
+
+        # clear before checking so the zone turning on right after the check still wakes the wait below
+        weather_zone_turned_on.clear()
+        weather_zone_state = get_grouped_light(weather_group_id) if weather_group_id else None
+        if weather_zone_state is not None and not weather_zone_state.on.on:
+            # nothing to do until the zone is turned on. the api isn't called while it's off, so stop backing off
+            weather_api_retry_secs = None
+            await weather_zone_turned_on.wait()
+        else:
+            await asyncio.sleep(weather_api_retry_secs or weather_update_time_secs)
 
-        await asyncio.sleep(weather_update_time_secs)
 
+def weather_zone_subscriber(event_type, item):
+    if item.id == weather_group_id and item.on and item.on.on:
+        weather_zone_turned_on.set()
 
-def get_inside_temp_in_f(bridge):
-    # log all temps
-    if logging.getLogger().isEnabledFor(logging.DEBUG):
-        try:
-            front_temp_obj = bridge.sensors.temperature.get(front_temp_id)
-            front_temp_f = celsius_to_fahrenheit(front_temp_obj.temperature.temperature)
-            logging.debug(f"front temp: {front_temp_f}"
-                          f" - time: {front_temp_obj.temperature.temperature_report.changed}")
-        except Exception as ex:
-            logging.debug(msg=f"error getting front temp", exc_info=ex)
 
-        try:
-            bathroom_temp_obj = bridge.sensors.temperature.get(bathroom_temp_id)
-            bathroom_temp_f = celsius_to_fahrenheit(bathroom_temp_obj.temperature.temperature)
-            logging.debug(f"bathroom temp: {bathroom_temp_f}"
-                          f" - time: {bathroom_temp_obj.temperature.temperature_report.changed}")
-        except Exception as ex:
-            logging.debug(msg=f"error getting bathroom temp", exc_info=ex)
+def get_weather_api_retry_secs(prev_retry_secs, ex):
+    # double the wait each time the api fails in a row, but never retry sooner than it asks (ex. 429 Retry-After)
+    if prev_retry_secs:
+        retry_secs = min(prev_retry_secs * 2, weather_api_max_retry_secs)
+    else:
+        retry_secs = weather_update_time_secs
+    if isinstance(ex, aiohttp.ClientResponseError) and ex.headers:
+        retry_after = ex.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            retry_secs = min(max(retry_secs, int(retry_after)), weather_api_max_retry_secs)
+    return retry_secs
+
+
+def get_weather_temp_scene(inside_temp: float, outside_temp: float) -> str:
+    upper_range = inside_temp + weather_temp_diff_range
+    lower_range = inside_temp - weather_temp_diff_range
+    freezing_temp = 32
+    if outside_temp <= freezing_temp:
+        logging.debug("outside temp is lower than freezing_temp: %s", freezing_temp)
+        return weather_temp_freezing_scene
+    if outside_temp < lower_range:
+        logging.debug("outside temp is lower than %s degrees", lower_range)
+        return weather_temp_colder_scene
+    if outside_temp > upper_range:
+        logging.debug("outside temp is higher than %s degrees", upper_range)
+        return weather_temp_hotter_scene
+    # outside temp close to inside
+    logging.debug("outside temp is close to inside temp")
+    return weather_temp_same_scene
+
+
+def get_inside_temp_in_f(bridge):
+    # log all temps. sensor reads are from aiohue's in-memory state so there is nothing to await
+    if debug_logging_enabled:
+        for temp_name, temp_id in (("front", front_temp_id), ("bathroom", bathroom_temp_id)):
+            try:
+                temp_obj = bridge.sensors.temperature.get(temp_id)
+                logging.debug("%s temp: %s - time: %s", temp_name,
+                              celsius_to_fahrenheit(temp_obj.temperature.temperature),
+                              temp_obj.temperature.temperature_report.changed)
+            except Exception as ex:
+                logging.debug("error getting %s temp", temp_name, exc_info=ex)
 
     # return temp from living room
     living_room_temp_obj = bridge.sensors.temperature.get(living_room_temp_id)
     living_room_temp_f = celsius_to_fahrenheit(living_room_temp_obj.temperature.temperature)
-    logging.debug(f"living temp: {living_room_temp_f}"
-                  f" - time: {living_room_temp_obj.temperature.temperature_report.changed}")
+    if debug_logging_enabled:
+        logging.debug("living temp: %s - time: %s",
+                      living_room_temp_f, living_room_temp_obj.temperature.temperature_report.changed)
 
     return living_room_temp_f
 
@@ -682,30 +865,50 @@ def celsius_to_fahrenheit(temp_celsius: float) -> float:
 # so your lights won't turn on when you're not home :)
 # the hue app doesn't let you make a routine to switch to a scene only if those lights are on :(
 # and custom apps people have built that do it cost money :(
-async def change_zone_scene_at_time_if_lights_on(bridge, time, room_name, room_group_id, scene_id):
+async def change_zone_scene_at_time_if_lights_on(bridge, scene_datetime, room_name, room_group_id, scene_id):
     try:
         group_state = bridge.groups.grouped_light.get(room_group_id)
         room_is_on = group_state.on.on
 
         if room_is_on:
-            logging.debug(
-                f"time is {time} and lights are on in {room_name} so we're changing the scene")
+            logging.debug("time is %s and lights are on in %s so we're changing the scene",
+                          scene_datetime.strftime(hour_min_format), room_name)
             await bridge.scenes.recall(scene_id)
 
     except Exception as ex:
-        logging.debug(msg=f"error changing scene in {room_name}", exc_info=ex)
+        logging.debug("error changing scene in %s", room_name, exc_info=ex)
         return
 
 
-def call_weather_api():
-    response = requests.get(
-        "https://api.openweathermap.org/data/2.5/weather"
-        f"?q={city_name}"
-        f"&appid={weather_api_key}"
-        "&units=imperial")
-    response.raise_for_status()
+async def call_weather_api():
+    global weather_api_cached_response
+    global weather_api_cached_datetime
+    global weather_api_cached_etag
+    global weather_api_cached_last_modified
 
-    return response
+    current_time = get_current_datetime()
+    if (weather_api_cached_response is not None
+            and weather_api_cached_datetime > current_time - timedelta(minutes=weather_api_cache_mins)):
+        logging.debug("using cached weather api response from %s", weather_api_cached_datetime)
+        return weather_api_cached_response
+
+    headers = {}
+    if weather_api_cached_response is not None:
+        if weather_api_cached_etag:
+            headers["If-None-Match"] = weather_api_cached_etag
+        if weather_api_cached_last_modified:
+            headers["If-Modified-Since"] = weather_api_cached_last_modified
+
+    async with weather_session.get(weather_api_url, params=weather_api_params, headers=headers) as response:
+        response.raise_for_status()
+        if response.status == 304:
+            logging.debug("weather api response not modified since %s", weather_api_cached_datetime)
+        else:
+            weather_api_cached_response = await response.json(loads=orjson.loads)
+            weather_api_cached_etag = response.headers.get("ETag")
+            weather_api_cached_last_modified = response.headers.get("Last-Modified")
+        weather_api_cached_datetime = current_time
+        return weather_api_cached_response
 
 
 # do stuff at certain times
@@ -722,46 +925,106 @@ async def schedules_routine(bridge, input_scheduled_room_names: list):
     while True:
         try:
             current_datetime_with_timezone = get_current_datetime()
-            current_time = current_datetime_with_timezone.strftime('%H:%M')
+            current_minute = current_datetime_with_timezone.hour * 60 + current_datetime_with_timezone.minute
 
             for room_name in scheduled_room_names:
                 try:
                     room_time_scenes_map = rooms_to_time_scenes_map[room_name]
-                    scene_id_for_current_time = room_time_scenes_map.get(current_time)
+                    scene_id_for_current_time = room_time_scenes_map.get(current_minute)
                     if scene_id_for_current_time is not None:
                         room_group_id = room_name_to_grouped_light_id_map[room_name]
                         await change_zone_scene_at_time_if_lights_on(
                             bridge,
-                            time=current_time,
+                            scene_datetime=current_datetime_with_timezone,
                             room_name=room_name,
                             room_group_id=room_group_id,
                             scene_id=scene_id_for_current_time)
                 except Exception as ex:
-                    logging.debug(msg=f"error checking {room_name} in schedules routine", exc_info=ex)
+                    logging.debug("error checking %s in schedules routine", room_name, exc_info=ex)
 
         except Exception as ex:
-            logging.debug(msg=f"error running schedules", exc_info=ex)
+            logging.debug(msg="error running schedules", exc_info=ex)
 
-        await asyncio.sleep(60)
+        # sleep until the next scheduled scene time, recomputing it when variables are refreshed
+        while True:
+            time_scenes_updated.clear()
+            try:
+                await asyncio.wait_for(time_scenes_updated.wait(),
+                                       timeout=get_secs_until_next_scheduled_scene(scheduled_room_names))
+            except TimeoutError:
+                break
+
+
+def get_secs_until_next_scheduled_scene(scheduled_room_names: list):
+    # sleep until the start of the minute of the next scheduled scene time instead of waking every minute.
+    # capped at the variable update interval so refreshed scene times (ex. sunset based) are picked up
+    current_datetime = get_current_datetime()
+    next_minute_datetime = current_datetime.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    secs_until_next_minute = (next_minute_datetime - current_datetime).total_seconds()
+    next_minute = next_minute_datetime.hour * 60 + next_minute_datetime.minute
+
+    minutes_until_next_scene = update_vars_interval_secs // 60 - 1
+    for room_name in scheduled_room_names:
+        room_time_scenes_map = rooms_to_time_scenes_map.get(room_name) if rooms_to_time_scenes_map else None
+        if not room_time_scenes_map:
+            continue
+        for scene_minute in room_time_scenes_map:
+            minutes_until_next_scene = min(minutes_until_next_scene, (scene_minute - next_minute) % (24 * 60))
+
+    return secs_until_next_minute + minutes_until_next_scene * 60
 
 
 def get_current_datetime():
-    current_time = datetime.now(timezone(my_timezone))
+    current_time = datetime.now(my_tz)
     # uncomment for testing
     # return datetime.strptime("5:12 pm", "%I:%M %p").replace(year=current_time.year, day=current_time.day, month=current_time.month)
     return current_time
 
 
-def get_sunset_time():
+async def update_sunset_time():
     global sunset_datetime
     if sunset_datetime is None \
             or sunset_datetime.date() != get_current_datetime().date():
         try:
-            return fetch_sunset_time_from_api()
+            if sunset_location:
+                calculated_sunset_time = calculate_sunset_time(get_current_datetime().date(), *sunset_location)
+                if calculated_sunset_time is not None:
+                    sunset_datetime = calculated_sunset_time
+                    logging.debug("calculated sunset datetime: %s", sunset_datetime)
+                    return
+            await fetch_sunset_time_from_api()
 
         except Exception as ex:
-            logging.debug(msg=f"error calling api for sunset time, msg:{ex}")
+            logging.debug("error calling api for sunset time, msg:%s", ex)
+
+
+def calculate_sunset_time(date, lat, lon):
+    # noaa sunrise equation, within a couple minutes of the weather api's sunset
+    # returns None when the sun doesn't set that day (polar day/night)
+    days_since_j2000 = date.toordinal() - datetime(2000, 1, 1).toordinal()
+    mean_solar_time = days_since_j2000 - lon / 360
+    mean_anomaly = math.radians((357.5291 + 0.98560028 * mean_solar_time) % 360)
+    equation_of_center = (1.9148 * math.sin(mean_anomaly)
+                          + 0.02 * math.sin(2 * mean_anomaly)
+                          + 0.0003 * math.sin(3 * mean_anomaly))
+    ecliptic_longitude = math.radians((math.degrees(mean_anomaly) + equation_of_center + 180 + 102.9372) % 360)
+    solar_transit = (2451545.0 + mean_solar_time
+                     + 0.0053 * math.sin(mean_anomaly)
+                     - 0.0069 * math.sin(2 * ecliptic_longitude))
+    sin_declination = math.sin(ecliptic_longitude) * math.sin(math.radians(23.4397))
+    cos_declination = math.cos(math.asin(sin_declination))
+    cos_hour_angle = ((math.sin(math.radians(-0.833)) - math.sin(math.radians(lat)) * sin_declination)
+                      / (math.cos(math.radians(lat)) * cos_declination))
+    if not -1 <= cos_hour_angle <= 1:
+        return None
 
+    sunset_julian_day = solar_transit + math.degrees(math.acos(cos_hour_angle)) / 360
+    # julian day 2440587.5 is the unix epoch
+    return datetime.fromtimestamp((sunset_julian_day - 2440587.5) * 86400, my_tz).replace(microsecond=0)
+
+
+def get_sunset_time():
+    # sunset_datetime is kept up to date by update_sunset_time() and the weather routine
     if sunset_datetime is not None:
         sunset_time = sunset_datetime
     else:
@@ -770,7 +1033,7 @@ def get_sunset_time():
     return sunset_time
 
 
-def fetch_sunset_time_from_api():
+async def fetch_sunset_time_from_api():
     api_fetch_interval_mins = 10
     current_time = get_current_datetime()
     global last_fetched_sunset_time
@@ -779,8 +1042,8 @@ def fetch_sunset_time_from_api():
             or last_fetched_sunset_time <= current_time - timedelta(minutes=api_fetch_interval_mins)):
         last_fetched_sunset_time = current_time
 
-        weather_api_response = call_weather_api()
-        fetched_sunset_time = parse_sunset_time_and_update(weather_api_response)
+        weather_data = await call_weather_api()
+        fetched_sunset_time = parse_sunset_time_and_update(weather_data)
         if fetched_sunset_time is not None:
             return fetched_sunset_time
         else:
@@ -789,14 +1052,14 @@ def fetch_sunset_time_from_api():
         raise Exception(f"Not calling api again, last called time: {last_fetched_sunset_time}")
 
 
-def parse_sunset_time_and_update(weather_api_response):
+def parse_sunset_time_and_update(weather_data: dict):
     global sunset_datetime
     try:
         if sunset_datetime is None \
                 or sunset_datetime.date() != get_current_datetime().date():
-            sunset_unix_utc = weather_api_response.json().get("sys").get("sunset")
-            sunset_datetime = datetime.fromtimestamp(sunset_unix_utc, timezone(my_timezone))
-            logging.debug(f"sunset datetime: {sunset_datetime}")
+            sunset_unix_utc = weather_data["sys"]["sunset"]
+            sunset_datetime = datetime.fromtimestamp(sunset_unix_utc, my_tz)
+            logging.debug("sunset datetime: %s", sunset_datetime)
         return sunset_datetime
     except Exception as ex:
         logging.debug(msg="error parsing sunset from weather api response", exc_info=ex)
@@ -809,6 +1072,8 @@ def parse_sunset_time_and_update(weather_api_response):
 # be scheduled to check for later)
 async def motion_room_off_routine(bridge):
     while True:
+        # clear before checking so an off time scheduled while checking still wakes the wait below
+        motion_room_scheduled_off_time_added.clear()
         try:
             global motion_room_scheduled_off_time_map
             global motion_id_to_room_map
@@ -838,39 +1103,50 @@ async def motion_room_off_routine(bridge):
 
                     if optional_contact_id and bridge.sensors.contact.get(
                                 optional_contact_id).contact_report.state == ContactState.CONTACT:
-                        # door is closed, don't turn lights off and schedule new off time
-                        schedule_motion_lights_off_time(motion_id, off_time_seconds)
+                        # door is closed, don't turn lights off. instead of rechecking later,
+                        # motion_room_contact_subscriber schedules a new off time when the door opens
+                        del motion_room_scheduled_off_time_map[motion_id]
+                        motion_ids_waiting_for_door_open.add(motion_id)
                         continue
 
                     # now turn lights off and remove scheduled off time
-                    logging.debug(f"turning {room_name} off since no motion")
+                    logging.debug("turning %s off since no motion", room_name)
                     await bridge.groups.grouped_light.set_state(id=room_group_id, on=False)
                     del motion_room_scheduled_off_time_map[motion_id]
 
         except Exception as ex:
-            logging.debug(msg=f"error checking scheduled times for motion lights off routine", exc_info=ex)
+            logging.debug(msg="error checking scheduled times for motion lights off routine", exc_info=ex)
 
-        # run every 3 seconds
-        await asyncio.sleep(3)
+        # sleep until the next scheduled off time instead of polling, or until a new off time is scheduled
+        next_off_datetime = None
+        if motion_room_scheduled_off_time_map:
+            next_off_datetime = min(motion_room_scheduled_off_time_map.values())
+        timeout_secs = None
+        if next_off_datetime:
+            # at least 1 second so a failing check doesn't spin
+            timeout_secs = max(1.0, (next_off_datetime - get_current_datetime()).total_seconds())
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(motion_room_scheduled_off_time_added.wait(), timeout=timeout_secs)
 
 
 def get_adjusted_brightness(brightness, brightness_adj):
-    result = brightness + brightness_adj
-    if result < 0:
-        return 0
-    if result > 100:
-        return 100
-    return result
+    return max(0, min(100, brightness + brightness_adj))
 
 
+@functools.lru_cache(maxsize=64)
 def normalize_holiday_name(holiday):
-    new_holiday = normalize_string(holiday).replace("'", "").replace(".", "").replace("day", "")
+    new_holiday = holiday.lower().translate(holiday_name_strip_table).replace("day", "")
     return "juneteenth" if new_holiday.startswith("juneteenth") else new_holiday
 
 
+# the same group/scene/device names are normalized on every refresh and event
+@functools.lru_cache(maxsize=1024)
 def normalize_string(input_string: str):
     return input_string.lower().replace(" ", "")
 
 
 with contextlib.suppress(KeyboardInterrupt):
-    asyncio.run(main())
+    if uvloop:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())